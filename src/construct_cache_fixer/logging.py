@@ -1,12 +1,14 @@
 """
 A smarter logger module that provides some utilities
 for a more convenient way to use the logging module.
+
+:raises ValueError: If the 'LOG_LEVEL' environment variable is defined with an unknown value.
 """
 
+import inspect
 import logging
 import os
-
-from inspect import stack, getmodule
+import sys
 
 
 CRITICAL = logging.CRITICAL
@@ -32,39 +34,41 @@ __name_to_level__ = {
     'DEBUG': DEBUG
 }
 
+__default_level_name__ = os.environ.get('LOG_LEVEL', 'INFO')
+
+try:
+    __default_level__ = __name_to_level__[__default_level_name__.upper()]
+
+except KeyError as exc:
+    raise ValueError(f"Unknown defined 'LOG_LEVEL' value: '{__default_level_name__}'") from exc
+
+__formatter__ = logging.Formatter("[%(asctime)s] %(levelname)s (%(name)s on %(processName)s:%(threadName)s): %(message)s")
+__handler__ = logging.StreamHandler()
+__handler__.setFormatter(__formatter__)
+
 
 class SmartLogger(logging.Logger):
     """
     A smarter logger implementation.
 
-    It will automatically set the log level based on the 'LOG_LEVEL' environment variable.
+    It will automatically set the log level based on the 'LOG_LEVEL' environment variable,
+    which is read once when this module is imported.
 
     :param name: The name of the logger.
     :type name: str
     :param level: The log level of the logger.
     :type level: int | None
-
-    :raises ValueError: If the 'LOG_LEVEL' environment variable is defined with an unknown value.
     """
 
 
     def __init__(self, name: str, level: int | None = None):
-        if not level:
-            level_name = os.environ.get('LOG_LEVEL', 'INFO')
-
-            try:
-                level = __name_to_level__[level_name]
-
-            except KeyError as exc:
-                raise ValueError(f"Unknown defined 'LOG_LEVEL' value: '{level_name}'") from exc
+        if level is None:
+            level = __default_level__
 
         super().__init__(name, level)
 
-        handler = logging.StreamHandler()
-        formatter = logging.Formatter("[%(asctime)s] %(levelname)s (%(name)s on %(processName)s:%(threadName)s): %(message)s")
-
-        handler.setFormatter(formatter)
-        self.addHandler(handler)
+        if not self.handlers:
+            self.addHandler(__handler__)
 
 
 logging.setLoggerClass(SmartLogger)
@@ -85,9 +89,11 @@ def getLogger(name: str | None = None) -> SmartLogger:
     """
 
     if not name:
-        frame = stack()[1]
-        module = getmodule(frame[0])
-        if module:
-            name = module.__name__
+        if hasattr(sys, '_getframe'):
+            frame = sys._getframe(1)
+        else:
+            frame = inspect.stack()[1].frame
+
+        name = frame.f_globals.get('__name__')
 
     return logging.getLogger(name)
@@ -5,14 +5,15 @@ This script is an utility that expects a Construct 3 exported game ZIP file.
 It will fix the cache problems that may occur when the game is served from a web server.
 """
 
+import os
 import re
 
 from argparse import ArgumentParser
+from itertools import chain
 from pathlib import Path
-from random import choices
 from string import ascii_letters, digits
 from sys import argv
-from typing import Generator
+from typing import Generator, Iterable
 from zipfile import ZipFile
 
 from construct_cache_fixer import logging
@@ -21,15 +22,25 @@ from construct_cache_fixer import logging
 _logger = logging.getLogger()
 _logger.setLevel(logging.INFO)
 
-ASSETS_PATTERNS = [
-    "*.css",
-    "*.js",
-    "*.json",
-    "*.png",
-    "*.ttf",
-    "*.wasm",
-    "*.webm"
-]
+# Maps each possible random byte to a letter or digit, so random strings are generated with a single `bytes.translate`.
+RANDOM_STRING_ALPHABET = (ascii_letters + digits).encode("ascii")
+RANDOM_STRING_TABLE = bytes(RANDOM_STRING_ALPHABET[byte % len(RANDOM_STRING_ALPHABET)] for byte in range(256))
+
+ASSETS_SUFFIXES = frozenset({
+    ".css",
+    ".js",
+    ".json",
+    ".png",
+    ".ttf",
+    ".wasm",
+    ".webm"
+})
+
+SOURCES_SUFFIXES = frozenset({
+    ".html",
+    ".js",
+    ".json"
+})
 
 
 def generate_random_string(length: int = 8) -> str:
@@ -43,21 +54,41 @@ def generate_random_string(length: int = 8) -> str:
     :rtype: str
     """
 
-    return "".join(choices(ascii_letters + digits, k=length))
+    return os.urandom(length).translate(RANDOM_STRING_TABLE).decode("ascii")
 
 
-def rename_asset(asset: Path) -> Path:
+def get_asset_name(asset: Path) -> str:
     """
-    Renames the asset with a random suffix.
+    Gets the name the asset is referenced with in the source code.
+
+    WebM assets are referenced without their extension.
+
+    :param asset: The asset to get the name of.
+    :type asset: Path
+
+    :return: The name of the asset.
+    :rtype: str
+    """
+
+    return asset.stem if asset.suffix == '.webm' else asset.name
+
+
+def rename_asset(asset: Path, suffix: str | None = None) -> Path:
+    """
+    Renames the asset with a suffix, random if not specified.
 
     :param asset: The asset to rename.
     :type asset: Path
+    :param suffix: The suffix to rename the asset with.
+    :type suffix: str | None
 
     :return: The renamed asset.
     :rtype: Path
     """
 
-    suffix = generate_random_string()
+    if suffix is None:
+        suffix = generate_random_string()
+
     new_asset = asset.with_stem(f"{asset.stem}_{suffix}")
 
     return new_asset
@@ -90,10 +121,32 @@ def extract_zip(archive_path: Path) -> Path:
     return extract_path
 
 
+def walk_files(folder_path: Path, suffixes: frozenset[str]) -> Generator[Path, None, None]:
+    """
+    Walks the directory tree once, yielding the files having one of the suffixes.
+
+    :param folder_path: The path to the directory to walk.
+    :type folder_path: Path
+    :param suffixes: The suffixes of the files to yield, including the leading dot.
+    :type suffixes: frozenset[str]
+
+    :return: The files having one of the suffixes.
+    :rtype: Generator[Path, None, None]
+    """
+
+    for dir_path, _, file_names in os.walk(folder_path):
+        for file_name in file_names:
+            # Like the `rglob` patterns, the suffixes are case-insensitive on Windows only.
+            if os.path.normcase(os.path.splitext(file_name)[1]) in suffixes:
+                yield Path(dir_path, file_name)
+
+
 def identify_assets(extract_path: Path) -> Generator[Path, None, None]:
     """
-    Identifies the assets of the game matching the defined patterns.
-    
+    Identifies the assets of the game matching the defined suffixes.
+
+    The directory tree is walked only once for all the suffixes.
+
     :param extract_path: The path to the directory where the ZIP file was extracted.
     :type extract_path: Path
 
@@ -103,87 +156,160 @@ def identify_assets(extract_path: Path) -> Generator[Path, None, None]:
 
     _logger.debug("Identifying the assets of the game in the directory: '%s'", extract_path)
 
-    for pattern in ASSETS_PATTERNS:
-        _logger.debug("Searching for assets matching the pattern: '%s'", pattern)
-
-        for asset in extract_path.rglob(pattern):
-            _logger.debug("Found an asset matching the pattern: '%s'", asset)
+    debug = _logger.isEnabledFor(logging.DEBUG)
+    for asset in walk_files(extract_path, ASSETS_SUFFIXES):
+        if debug:
+            _logger.debug("Found an asset matching the suffixes: '%s'", asset)
 
-            yield asset
+        yield asset
 
     _logger.info("The assets of the game were identified successfully.")
 
 
-def search_for_asset_uses(folder_path: Path, asset: Path) -> Generator[Path, None, None]:
+def compile_assets_regex(assets_names: Iterable[bytes]) -> re.Pattern[bytes]:
+    """
+    Compiles a regex matching any of the encoded assets names surrounded by non-word characters.
+
+    The matched asset name is captured by the first group. The names are tried from the longest
+    to the shortest, so a WebM asset referenced by its stem (e.g. `music`) doesn't match
+    the beginning of a longer name (e.g. `music.png`).
+
+    :param assets_names: The UTF-8 encoded names of the assets to match.
+    :type assets_names: Iterable[bytes]
+
+    :return: The compiled regex.
+    :rtype: re.Pattern[bytes]
+    """
+
+    return re.compile(b"(?<=\\W)(" + b"|".join(map(re.escape, sorted(assets_names, key=len, reverse=True))) + b")(?=\\W)")
+
+
+def identify_source_files(folder_path: Path) -> tuple[Path, ...]:
     """
-    Searches for the uses of the asset in the source code.
+    Identifies the source files of the game where the assets may be used.
 
-    :param folder_path: The path to the directory where to search for the uses of the asset.
+    The directory tree is walked only once and the result is meant
+    to be reused for the search of all the assets.
+
+    :param folder_path: The path to the directory where to search for the source files.
     :type folder_path: Path
-    :param asset: The asset to search for its uses.
-    :type asset: Path
 
-    :return: The list of source files where the asset is used.
-    :rtype: Generator[Path, None, None]
+    :return: The source files of the game.
+    :rtype: tuple[Path, ...]
     """
 
-    source_files = [
-        *folder_path.rglob("*.html"),
-        *folder_path.rglob("*.js"),
-        *folder_path.rglob("*.json")
-    ]
+    return tuple(walk_files(folder_path, SOURCES_SUFFIXES))
 
-    _logger.debug("Looking for the uses of the asset: '%s'", asset)
 
-    found: bool = False
-    for source_file in source_files:
-        asset_name = asset.stem if asset.suffix == '.webm' else asset.name
-        asset_regex = re.compile(f"\\W{re.escape(asset_name)}\\W")
+def search_for_assets_names(source_file: Path, assets_hints: frozenset[bytes], assets_regex: re.Pattern[bytes]) -> set[bytes]:
+    """
+    Searches for the names of the assets used in a single source file.
 
-        _logger.debug("Looking for the uses of the assets in the source file: '%s'", source_file)
+    The file is read as raw bytes, without decoding it, and scanned at most once
+    by the regex, only if at least one of the hints is found as a substring of the file.
+
+    :param source_file: The source file where to search for the uses of the assets.
+    :type source_file: Path
+    :param assets_hints: The substrings at least one of which is part of any use of the assets.
+    :type assets_hints: frozenset[bytes]
+    :param assets_regex: The regex matching the encoded names of the assets.
+    :type assets_regex: re.Pattern[bytes]
+
+    :return: The encoded names of the assets used in the source file.
+    :rtype: set[bytes]
+    """
+
+    _logger.debug("Looking for the uses of the assets in the source file: '%s'", source_file)
+
+    with open(source_file, 'rb') as file:
+        content = file.read()
+
+    # A few plain substring checks are much cheaper than the regex and rule out the files not using any asset.
+    if not any(asset_hint in content for asset_hint in assets_hints):
+        return set()
+
+    return {match.group(1) for match in assets_regex.finditer(content)}
+
+
+def search_for_assets_uses(source_files: tuple[Path, ...], assets_names: dict[Path, str]) -> dict[Path, list[Path]]:
+    """
+    Searches for the uses of the assets in the source code.
 
-        with open(source_file, 'r', encoding='utf-8') as file:
-            for line in file.readlines():
-                if asset_regex.search(line):
+    Each source file is read and scanned only once, looking for all the assets at the same time.
+
+    :param source_files: The source files where to search for the uses of the assets.
+    :type source_files: tuple[Path, ...]
+    :param assets_names: The names of the assets to search for their uses, indexed by the assets.
+    :type assets_names: dict[Path, str]
+
+    :return: The source files where each asset is used.
+    :rtype: dict[Path, list[Path]]
+
+    :raises FileNotFoundError: If an asset is not used in any of the source files.
+    """
+
+    if not assets_names:
+        return {}
+
+    assets_by_name: dict[bytes, list[Path]] = {}
+    for asset, asset_name in assets_names.items():
+        assets_by_name.setdefault(asset_name.encode('utf-8'), []).append(asset)
+
+    assets_regex = compile_assets_regex(assets_by_name)
+
+    # Checking every name as a substring of every file would cost more than the regex itself,
+    # so only the few distinct extensions (or the whole names, when they have none) are checked.
+    assets_hints = frozenset(os.path.splitext(asset_name)[1] or asset_name for asset_name in assets_by_name)
+    assets_uses: dict[Path, list[Path]] = {asset: [] for asset in assets_names}
+
+    debug = _logger.isEnabledFor(logging.DEBUG)
+    for source_file in source_files:
+        for asset_name in search_for_assets_names(source_file, assets_hints, assets_regex):
+            for asset in assets_by_name[asset_name]:
+                if debug:
                     _logger.debug("Found a use of the asset '%s' in the source file: '%s'", asset, source_file)
-    
-                    found = True
 
-                    yield source_file
-                    break
+                assets_uses[asset].append(source_file)
 
-    if not found:
-        raise FileNotFoundError(f"The asset '{asset}' was not found in the source code.")
+    for asset, asset_uses in assets_uses.items():
+        if not asset_uses:
+            raise FileNotFoundError(f"The asset '{asset}' was not found in the source code.")
 
+    return assets_uses
 
-def replace_asset_uses(source_file: Path, old_asset: Path, new_asset: Path) -> None:
+
+def replace_assets_uses(source_file: Path, assets_regex: re.Pattern[bytes], new_assets_names: dict[bytes, bytes]) -> None:
     """
-    Replaces the uses of the old asset with the new asset in the source file.
+    Replaces the uses of the old assets with the new assets in the source file.
+
+    All the assets are replaced in a single pass over the raw bytes of the source file,
+    which is only written back if something was actually replaced.
 
-    :param source_file: The source file where to replace the uses of the asset.
+    :param source_file: The source file where to replace the uses of the assets.
     :type source_file: Path
-    :param old_asset: The old asset to replace.
-    :type old_asset: Path
-    :param new_asset: The new asset to replace with.
-    :type new_asset: Path
+    :param assets_regex: The regex matching the encoded names of the old assets.
+    :type assets_regex: re.Pattern[bytes]
+    :param new_assets_names: The encoded names of the new assets, indexed by the encoded names of the old assets.
+    :type new_assets_names: dict[bytes, bytes]
 
     :return: None
     """
 
-    _logger.debug("Replacing the uses of the asset '%s' with the new asset '%s' in the source file '%s'", old_asset, new_asset, source_file)
+    _logger.debug("Replacing the uses of the assets in the source file '%s'", source_file)
 
-    with open(source_file, 'r', encoding='utf-8') as file:
+    with open(source_file, 'rb') as file:
         content = file.read()
 
-    old_asset_name = old_asset.stem if old_asset.suffix == '.webm' else old_asset.name
-    new_asset_name = new_asset.stem if new_asset.suffix == '.webm' else new_asset.name
+    content, replacements = assets_regex.subn(lambda match: new_assets_names[match.group(1)], content)
+    if not replacements:
+        _logger.info("No uses of the assets were found in the source file '%s'. Skipping the replacement.", source_file)
 
-    content = content.replace(old_asset_name, new_asset_name)
+        return
 
-    with open(source_file, 'w', encoding='utf-8') as file:
+    with open(source_file, 'wb') as file:
         file.write(content)
 
-    _logger.info("The uses of the asset '%s' were replaced with the new asset '%s' in the source file '%s'", old_asset, new_asset, source_file)
+    _logger.info("The uses of the assets were replaced in the source file '%s'", source_file)
 
 
 def main() -> None:
@@ -206,17 +332,34 @@ def main() -> None:
         raise FileNotFoundError(f"The specified file '{archive_path}' does not exist.")
 
     extract_path = extract_zip(archive_path)
-    assets = identify_assets(extract_path)
-
-    for asset in assets:
-        _logger.debug("Looking for the uses of the asset: '%s'", asset)
-
-        asset_uses = search_for_asset_uses(extract_path, asset)
-        new_asset = rename_asset(asset)
-
-        for asset_use in asset_uses:
-            replace_asset_uses(asset_use, asset, new_asset)
-
+    source_files = identify_source_files(extract_path)
+    assets_names = {asset: get_asset_name(asset) for asset in identify_assets(extract_path)}
+    assets_uses = search_for_assets_uses(source_files, assets_names)
+
+    # Assets sharing the same name (e.g. in different folders) can't be told apart
+    # in the source code, so they are all renamed with the same suffix.
+    suffixes: dict[str, str] = {}
+    new_assets: dict[Path, Path] = {}
+    new_assets_names: dict[bytes, bytes] = {}
+    for asset in assets_uses:
+        asset_name = assets_names[asset]
+        if asset_name not in suffixes:
+            suffixes[asset_name] = generate_random_string()
+
+        new_asset = rename_asset(asset, suffixes[asset_name])
+
+        new_assets[asset] = new_asset
+        new_assets_names[asset_name.encode('utf-8')] = get_asset_name(new_asset).encode('utf-8')
+
+    if new_assets_names:
+        assets_regex = compile_assets_regex(new_assets_names)
+
+        for source_file in dict.fromkeys(chain.from_iterable(assets_uses.values())):
+            replace_assets_uses(source_file, assets_regex, new_assets_names)
+
+    # The assets are renamed only once all the uses were replaced,
+    # since some of them are also source files that may still need to be updated.
+    for asset, new_asset in new_assets.items():
         _logger.info("Renaming the asset '%s' to the new asset: '%s'", asset, new_asset.name)
         asset.rename(new_asset)
 